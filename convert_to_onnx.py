@@ -0,0 +1,31 @@
+"""One-off conversion of the joblib RandomForest to ONNX for serving.
+
+Usage: python convert_to_onnx.py [full_linear_rf_model.joblib] [model.onnx]
+
+The server prefers model.onnx when present; see predict_cluster.py.
+"""
+import sys
+
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+
+def main():
+    src = sys.argv[1] if len(sys.argv) > 1 else "full_linear_rf_model.joblib"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "model.onnx"
+    model = joblib.load(src)
+    onx = convert_sklearn(
+        model,
+        initial_types=[("input", FloatTensorType([None, 6]))],
+        # zipmap off: emit probabilities as a plain (n, 5) tensor instead of
+        # a list of dicts, so the server can index it directly.
+        options={id(model): {"zipmap": False}},
+    )
+    with open(dst, "wb") as f:
+        f.write(onx.SerializeToString())
+    print(f"Wrote {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import multiprocessing
+
+# Threaded workers: numpy/sklearn release the GIL inside native inference
+# code, so a handful of threads per worker overlaps request parse/encode
+# with the batched predict. gevent is avoided because the C extensions do
+# not cooperate with its monkey-patching.
+workers = multiprocessing.cpu_count()
+worker_class = "gthread"
+threads = 8
+timeout = 30
+
+# Import the app (and load the model) in the master before forking, so the
+# workers share the model's read-only pages copy-on-write instead of each
+# holding its own copy.
+preload_app = True
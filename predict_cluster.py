@@ -1,19 +1,193 @@
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS 
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import JSONProvider
+from flask_cors import CORS
+import functools
+import orjson
 import os
+import queue
+import threading
+import time
 import joblib
-import pandas as pd
+import numpy as np
+
+from validate import ERRORS, validate_and_homa
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson-backed JSON provider: request.get_json() and jsonify use
+    orjson's parser/encoder instead of the stdlib json module."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 
 # Create Flask app
 app = Flask(__name__, static_folder="build")
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for all routes
 
-# Load model
+# Load model. An ONNX export (see convert_to_onnx.py) is preferred when
+# present: onnxruntime's compiled tree traversal replaces sklearn's
+# per-call Python/Cython dispatch on the hot path. The pickled sklearn
+# estimator remains the fallback.
 MODEL_PATH = 'full_linear_rf_model.joblib'
-if not os.path.isfile(MODEL_PATH):
+ONNX_PATH = os.environ.get("ONNX_MODEL_PATH", "model.onnx")
+
+model = None
+_sess = None
+if os.path.isfile(ONNX_PATH):
+    import onnxruntime as ort
+
+    # Single-threaded session: lowest latency on small batches; the
+    # gunicorn workers provide the parallelism.
+    _opts = ort.SessionOptions()
+    _opts.intra_op_num_threads = 1
+    _opts.inter_op_num_threads = 1
+    _sess = ort.InferenceSession(ONNX_PATH, sess_options=_opts,
+                                 providers=["CPUExecutionProvider"])
+    # skl2onnx emits "label" and "probabilities"; only the latter is needed.
+    _PROB_OUTPUT = _sess.get_outputs()[1].name
+    _sess.run([_PROB_OUTPUT], {"input": np.zeros((1, 6), dtype=np.float32)})
+elif os.path.isfile(MODEL_PATH):
+    # mmap the tree arrays read-only: they live in the page cache and are
+    # shared across the pre-forked gunicorn workers instead of being copied
+    # into each worker's heap (gunicorn_conf.py sets preload_app).
+    model = joblib.load(MODEL_PATH, mmap_mode="r")
+
+    # The model was fitted on a DataFrame; drop the stored feature names so
+    # it accepts plain arrays without warning about missing column labels.
+    if hasattr(model, "feature_names_in_"):
+        del model.feature_names_in_
+
+    # Predict over trees in parallel; warm up once at import so the first
+    # real request does not pay joblib's worker start-up cost.
+    model.n_jobs = int(os.environ.get("RF_N_JOBS", os.cpu_count()))
+    model.predict_proba(np.zeros((1, 6), dtype=np.float32))
+else:
     raise FileNotFoundError(f"Model file {MODEL_PATH} does not exist.")
-model = joblib.load(MODEL_PATH)
+
+# Trigger the Numba compile (or cache load) at boot, not on the first request.
+validate_and_homa(0.0, 5.0, 25.0, 40.0, 1.0, 6.0)
+
+# Micro-batching: requests enqueue their feature row and block on an event;
+# a single worker thread collects rows arriving within a short window and
+# runs one batched inference, amortizing sklearn's per-call overhead.
+_BATCH_SIZE = int(os.environ.get("PREDICT_BATCH_SIZE", 64))
+_BATCH_MAX_LATENCY = float(os.environ.get("PREDICT_BATCH_LATENCY", 0.02))  # seconds
+# Backstop so a request never blocks past the gunicorn timeout if the
+# worker thread is wedged; well above any plausible batch latency.
+_PREDICT_TIMEOUT = float(os.environ.get("PREDICT_TIMEOUT", 10))  # seconds
+_queue = queue.Queue()
+
+# Cluster labels indexed by predicted class
+_LABELS = ("SAID", "SIDD", "SIRD", "MOD", "MARD")
+
+# Preallocated batch buffer, owned by the worker thread. float32 matches
+# what both backends use internally (sklearn trees store float32
+# thresholds, the ONNX input is a float tensor), so no upcast/copy happens
+# inside the predict call. Feature order matches training: gad, a1c, bmi,
+# diabetes_age, homa1_cpeptide_b, homa1_cpeptide_ir
+_batch_X = np.empty((_BATCH_SIZE, 6), dtype=np.float32)
+
+
+def _batch_worker():
+    while True:
+        pending = [_queue.get()]
+        deadline = time.monotonic() + _BATCH_MAX_LATENCY
+        while len(pending) < _BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        n = len(pending)
+        try:
+            for i, (features, _, _) in enumerate(pending):
+                _batch_X[i] = features
+            X = _batch_X[:n]
+            if _sess is not None:
+                probs = _sess.run([_PROB_OUTPUT], {"input": X})[0]
+                clusters = probs.argmax(axis=1)
+            else:
+                # Threading backend: tree traversal is C code that releases
+                # the GIL, and threads avoid loky's process start-up
+                # overhead.
+                with joblib.parallel_backend("threading"):
+                    probs = model.predict_proba(X)
+                # The label is the argmax of the probabilities, mapped
+                # through classes_; a separate predict() would re-traverse
+                # every tree.
+                clusters = model.classes_[probs.argmax(axis=1)]
+        except Exception as exc:
+            # Hand the failure back to the waiting requests (each becomes a
+            # 500) and keep consuming; the worker must never die.
+            for _, event, slot in pending:
+                slot["error"] = exc
+                event.set()
+            continue
+        for i, (_, event, slot) in enumerate(pending):
+            slot["cluster"] = int(clusters[i])
+            slot["probabilities"] = probs[i]
+            event.set()
+
+
+# The worker thread is started lazily on the first prediction rather than
+# at import: with preload_app the module imports once in the gunicorn
+# master, and a thread started there would not survive the fork into the
+# workers. Lazy start gives every serving process its own consumer.
+_worker_started = False
+_worker_start_lock = threading.Lock()
+
+
+def _ensure_batch_worker():
+    global _worker_started
+    if not _worker_started:
+        with _worker_start_lock:
+            if not _worker_started:
+                threading.Thread(target=_batch_worker, daemon=True).start()
+                _worker_started = True
+
+
+def _predict_one(features):
+    """Submit one feature row to the batch worker and wait for its result."""
+    _ensure_batch_worker()
+    event = threading.Event()
+    slot = {}
+    _queue.put((features, event, slot))
+    if not event.wait(timeout=_PREDICT_TIMEOUT):
+        raise RuntimeError("Timed out waiting for the batch worker.")
+    if "error" in slot:
+        raise slot["error"]
+    return slot["cluster"], slot["probabilities"]
+
+
+@functools.lru_cache(maxsize=4096)
+def _infer(gad, hba1c_x10, bmi_x10, age, homa1_b, homa1_ir):
+    """Predict the labelled cluster for a quantized input key.
+
+    Keys are the directly-measured inputs quantized to their clinical
+    resolution (HbA1c/BMI in tenths, age in whole years) plus the exact
+    HOMA1 values computed from C-peptide and glucose during validation —
+    recomputing them from quantized glucose would divide by zero for
+    valid glucose just above the 3.5 bound. The return value is the
+    finished (label, rounded probabilities) pair, so repeated submissions
+    of the same measurements become a dict lookup with no forest
+    traversal, rounding or label mapping left on the request path.
+    """
+    cluster, cluster_prob = _predict_one((gad, hba1c_x10 / 10.0,
+                                          bmi_x10 / 10.0, age,
+                                          homa1_b, homa1_ir))
+    # Stay in numpy: orjson serializes the array directly (float64 so the
+    # rounded values print exactly, e.g. 0.123 rather than a float32 repr).
+    # rint of the scaled values is np.round's 3-decimal case without its
+    # generic decimal bookkeeping.
+    probs = np.rint(cluster_prob.astype(np.float64) * 1000.0) / 1000.0
+    return _LABELS[cluster], probs
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -30,51 +204,25 @@ def predict():
     except (KeyError, ValueError):
         return jsonify({'error': 'Invalid input data'}), 400
 
-    # Check input values are within required range
-    if not ((gad == 1) or (gad == 0)):
-        return jsonify({'error': 'GAD autoantibody value must be 0 (negative) or 1 (positive).'}), 400
-    if not (4.7 <= hba1c <= 18.1):
-        return jsonify({'error': 'HbA1c value must be between 4.7 and 18.1%.'}), 400
-    if not (19 <= bmi <= 60):
-        return jsonify({'error': 'BMI value must be between 19 and 60 kg/m2.'}), 400
-    if not (0.2 <= cpeptide <= 3.5):
-        return jsonify({'error': 'C-peptide value must be between 0.2 and 3.5 nmol/L.'}), 400
-    if not (3.5 < glucose <= 25):
-        return jsonify({'error': 'Glucose value must be greater than 3.5 and less than or equal to 25 mmol/L.'}), 400
-    if not (18 <= age <= 88):
-        return jsonify({'error': 'Age must be between 18 and 88 years.'}), 400
-
-    # Approximate HOMA1
-    homa1_b = (20 * 6 * cpeptide) / (glucose - 3.5)
-    homa1_ir = (glucose * 6 * cpeptide) / 22.5
-
-    # Construct input to match training format
-    x = pd.DataFrame({
-        "gad": [gad],
-        "a1c": [hba1c],
-        "bmi": [bmi],
-        "diabetes_age": [age],
-        "homa1_cpeptide_b": [homa1_b],
-        "homa1_cpeptide_ir": [homa1_ir]
-    })
-    
-    # Predict cluster
-    cluster = model.predict(x)[0]
-    cluster_prob = model.predict_proba(x)[0]
-
-    # Round probabilities to 3 decimal places
-    cluster_prob_rounded = [round(prob, 3) for prob in cluster_prob.tolist()]
+    # Range-check inputs and compute HOMA1 in one compiled call
+    err_code, homa1_b, homa1_ir = validate_and_homa(gad, hba1c, bmi, age,
+                                                    cpeptide, glucose)
+    if err_code:
+        return jsonify({'error': ERRORS[err_code]}), 400
 
-    # Translate cluster number to label
-    cluster_dict = {0: "SAID", 1: "SIDD", 2: "SIRD", 3: "MOD", 4: "MARD"}
-    cluster_label = cluster_dict[cluster]
+    # Predict cluster: cached on the quantized inputs, batched with any
+    # concurrent requests on a miss
+    cluster_label, cluster_prob_rounded = _infer(int(gad), round(hba1c * 10),
+                                                 round(bmi * 10), round(age),
+                                                 homa1_b, homa1_ir)
 
     # Return output
     output = {
         'cluster_label': cluster_label,
         'probabilities': cluster_prob_rounded
     }
-    return jsonify(output)
+    return Response(orjson.dumps(output, option=orjson.OPT_SERIALIZE_NUMPY),
+                    mimetype='application/json')
     
 
 # Serve React static files
@@ -84,7 +232,4 @@ def serve_react(path):
     if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
         return send_from_directory(app.static_folder, path)
     else:
-        return send_from_directory(app.static_folder, "index.html")
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5001)))
\ No newline at end of file
+        return send_from_directory(app.static_folder, "index.html")
\ No newline at end of file
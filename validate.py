@@ -0,0 +1,84 @@
+"""Input validation and HOMA1 computation for /predict, compiled with Numba."""
+
+import numpy as np
+
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:  # fall back to a vectorized NumPy check
+    _HAVE_NUMBA = False
+
+
+# Error messages indexed by the err_code returned from validate_and_homa;
+# index 0 is unused (it means the inputs are valid).
+ERRORS = (
+    "",
+    "GAD autoantibody value must be 0 (negative) or 1 (positive).",
+    "HbA1c value must be between 4.7 and 18.1%.",
+    "BMI value must be between 19 and 60 kg/m2.",
+    "C-peptide value must be between 0.2 and 3.5 nmol/L.",
+    "Glucose value must be greater than 3.5 and less than or equal to 25 mmol/L.",
+    "Age must be between 18 and 88 years.",
+)
+
+
+def _homa1(cpeptide, glucose):
+    # Approximate HOMA1
+    homa1_b = (20.0 * 6.0 * cpeptide) / (glucose - 3.5)
+    homa1_ir = (glucose * 6.0 * cpeptide) / 22.5
+    return homa1_b, homa1_ir
+
+
+if _HAVE_NUMBA:
+    # No fastmath: its no-NaN assumption would make the comparisons below
+    # undefined for NaN inputs, which must fail validation.
+    @njit(cache=True)
+    def validate_and_homa(gad, hba1c, bmi, age, cpeptide, glucose):
+        """Range-check the six inputs and compute the HOMA1 approximations.
+
+        Returns (err_code, homa1_b, homa1_ir). err_code 0 means the inputs
+        are valid; a non-zero code indexes the matching message in ERRORS.
+        """
+        if not ((gad == 1.0) or (gad == 0.0)):
+            return 1, 0.0, 0.0
+        if not (4.7 <= hba1c <= 18.1):
+            return 2, 0.0, 0.0
+        if not (19.0 <= bmi <= 60.0):
+            return 3, 0.0, 0.0
+        if not (0.2 <= cpeptide <= 3.5):
+            return 4, 0.0, 0.0
+        if not (3.5 < glucose <= 25.0):
+            return 5, 0.0, 0.0
+        if not (18.0 <= age <= 88.0):
+            return 6, 0.0, 0.0
+
+        # Approximate HOMA1
+        homa1_b = (20.0 * 6.0 * cpeptide) / (glucose - 3.5)
+        homa1_ir = (glucose * 6.0 * cpeptide) / 22.5
+        return 0, homa1_b, homa1_ir
+else:
+    # Interval bounds in check order hba1c, bmi, cpeptide, glucose, age
+    # (GAD is exact-match, handled separately). The glucose lower bound is
+    # exclusive, so it is nudged to the next representable double.
+    _LOW = np.array([4.7, 19.0, 0.2, np.nextafter(3.5, np.inf), 18.0])
+    _HIGH = np.array([18.1, 60.0, 3.5, 25.0, 88.0])
+    _CODES = (2, 3, 4, 5, 6)
+
+    def validate_and_homa(gad, hba1c, bmi, age, cpeptide, glucose):
+        """Range-check the six inputs and compute the HOMA1 approximations.
+
+        Returns (err_code, homa1_b, homa1_ir). err_code 0 means the inputs
+        are valid; a non-zero code indexes the matching message in ERRORS.
+        One vectorized compare against the bound arrays replaces the six
+        interpreted interval tests.
+        """
+        if not ((gad == 1.0) or (gad == 0.0)):
+            return 1, 0.0, 0.0
+        v = np.array([hba1c, bmi, cpeptide, glucose, age])
+        # Negated inside-range test so NaN (which compares false against
+        # both bounds) counts as out of range, matching the scalar checks.
+        bad = ~((v >= _LOW) & (v <= _HIGH))
+        if bad.any():
+            return _CODES[int(bad.argmax())], 0.0, 0.0
+        homa1_b, homa1_ir = _homa1(cpeptide, glucose)
+        return 0, homa1_b, homa1_ir